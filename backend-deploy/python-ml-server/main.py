@@ -4,8 +4,10 @@ import hashlib
 import os
 import logging
 import io
+import asyncio
+import threading
 import numpy as np
-from PIL import Image
+from PIL import Image  # Pillow-SIMD drop-in (see requirements.txt) vectorizes the resize kernels
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
@@ -39,16 +41,59 @@ else:
 
 # Load TFLite model for prediction endpoint
 prediction_interpreter = None
+model_input_dtype = np.float32
+model_output_quant = (0.0, 0)
+model_input_indices = []
+model_output_index = None
 if tf_available:
     try:
         logger.info(f"🔄 Loading TFLite model from: {TFLITE_MODEL}")
-        prediction_interpreter = tf.lite.Interpreter(model_path=str(TFLITE_MODEL))
+        # Each uvicorn worker process holds its own interpreter, so with
+        # several workers keep the per-interpreter thread count modest to
+        # avoid oversubscribing cores. Both launch paths (Procfile and the
+        # __main__ block) export WEB_CONCURRENCY so workers see the real count.
+        _workers = int(os.getenv("WEB_CONCURRENCY") or 1)
+        tflite_threads = 2 if _workers > 1 else os.cpu_count()
+        # XNNPACK runs the fp32 conv/matmul kernels vectorized (AVX2/NEON), which is the
+        # dominant cost of invoke(). Recent TF builds ship it default-on when num_threads
+        # is set, so the explicit delegate load is best-effort.
+        try:
+            xnnpack_delegate = tf.lite.experimental.load_delegate('libtensorflowlite_xnnpack_delegate.so')
+            prediction_interpreter = tf.lite.Interpreter(
+                model_path=str(TFLITE_MODEL),
+                num_threads=tflite_threads,
+                experimental_delegates=[xnnpack_delegate]
+            )
+            logger.info("✅ XNNPACK delegate attached")
+        except Exception:
+            prediction_interpreter = tf.lite.Interpreter(
+                model_path=str(TFLITE_MODEL),
+                num_threads=tflite_threads
+            )
+            logger.info("⚠️ XNNPACK delegate not found - using TF's built-in kernels")
         prediction_interpreter.allocate_tensors()
         
         # Get input and output details
         input_details = prediction_interpreter.get_input_details()
         output_details = prediction_interpreter.get_output_details()
-        
+
+        # Full-integer quantized models (see quantize_model_int8.py) take raw uint8
+        # pixels and emit quantized scores that need dequantizing on the way out
+        model_input_dtype = input_details[0]['dtype']
+        if model_input_dtype not in (np.float32, np.uint8):
+            # e.g. an int8-input model: the LUT fill would truncate every value
+            # to 0 and serve constant scores - refuse loudly instead
+            raise RuntimeError(
+                f"Unsupported model input dtype {np.dtype(model_input_dtype).name}; "
+                "the serving buffers handle float32 or uint8 input only"
+            )
+        model_output_quant = output_details[0].get('quantization', (0.0, 0))
+
+        # Tensor indices are constant metadata - cache them so the hot path never
+        # pays the get_*_details() dict allocations again
+        model_input_indices = [detail['index'] for detail in input_details]
+        model_output_index = output_details[0]['index']
+
         logger.info(f"✅ Prediction model loaded successfully")
         logger.info(f"   Input shape: {input_details[0]['shape']}")
         logger.info(f"   Output shape: {output_details[0]['shape']}")
@@ -61,6 +106,87 @@ if tf_available:
 else:
     logger.warning("⚠️ TensorFlow not available - skipping model loading")
 
+# Fused uint8 -> float32 / 255.0 normalization: a 256-entry lookup table applied in a
+# single pass, written into persistent batch buffers so the hot path allocates nothing.
+_NORM_LUT = np.arange(256, dtype=np.float32) / 255.0
+_T1_BUF = np.empty((1, 224, 224, 3), dtype=model_input_dtype)
+_T2_BUF = np.empty((1, 224, 224, 3), dtype=model_input_dtype)
+# Single-input models take both modalities pre-stacked; normalization writes into
+# slices of this once-allocated buffer instead of re-stacking per request
+_DUAL_BUF = np.empty((1, 2, 224, 224, 3), dtype=model_input_dtype)
+
+# The TFLite interpreter is not thread-safe and the input buffers are shared, so
+# everything from buffer fill to output read runs under one lock (per-process;
+# each uvicorn worker gets its own interpreter and buffers)
+_INFER_LOCK = threading.Lock()
+
+# Output index 0 = no Modic, index 1 = Modic
+_LABELS = ("No Modic", "Modic")
+
+
+def _decode_image(raw: bytes) -> Image.Image:
+    """Decode an uploaded image to 224x224 RGB via the cheapest path available."""
+    img = Image.open(io.BytesIO(raw))
+    # For JPEGs, draft() lets libjpeg downscale in the DCT domain while decoding,
+    # which is far cheaper than a full-res decode followed by a resize
+    img.draft('RGB', (224, 224))
+    # Only pay the convert() copy when the image isn't already 3-channel
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # BILINEAR is plenty for NN input and ~3x cheaper than BICUBIC
+    return img.resize((224, 224), Image.BILINEAR)
+
+
+def _run_inference(t1_bytes: bytes, t2_bytes: bytes):
+    """Decode, preprocess and run the model; returns (no_modic_score, modic_score).
+
+    Runs on a worker thread (asyncio.to_thread) so the event loop stays free.
+    Only the shared-buffer fill and the interpreter run are serialized, so one
+    request can decode while another is inside invoke().
+    """
+    t1_resized = _decode_image(t1_bytes)
+    t2_resized = _decode_image(t2_bytes)
+
+    with _INFER_LOCK:
+        # Pick the destination slices up front: separate T1/T2 buffers for dual-input
+        # models, the pre-stacked 5D buffer for single-input models
+        if len(model_input_indices) == 2:
+            dst_t1, dst_t2 = _T1_BUF[0], _T2_BUF[0]
+        else:
+            dst_t1, dst_t2 = _DUAL_BUF[0, 0], _DUAL_BUF[0, 1]
+
+        # np.asarray gives a zero-copy uint8 view of PIL's buffer; the LUT take (or
+        # the raw copy for quantized models) is then the only pass over the pixels
+        if _T1_BUF.dtype == np.uint8:
+            np.copyto(dst_t1, np.asarray(t1_resized))
+            np.copyto(dst_t2, np.asarray(t2_resized))
+        else:
+            np.take(_NORM_LUT, np.asarray(t1_resized), out=dst_t1)
+            np.take(_NORM_LUT, np.asarray(t2_resized), out=dst_t2)
+
+        # Run prediction with TFLite interpreter (tensor indices cached at load time)
+        # Buffer shapes are constant, so they are logged at startup rather than here
+        if len(model_input_indices) == 2:
+            # Dual input model - buffers already carry the batch dimension
+            prediction_interpreter.set_tensor(model_input_indices[0], _T1_BUF)
+            prediction_interpreter.set_tensor(model_input_indices[1], _T2_BUF)
+        else:
+            # Single input model - combined input was written in place above
+            prediction_interpreter.set_tensor(model_input_indices[0], _DUAL_BUF)
+
+        # Run inference
+        prediction_interpreter.invoke()
+
+        # Get output
+        output = prediction_interpreter.get_tensor(model_output_index)[0]  # Remove batch dimension
+
+    # Dequantize integer outputs back to float scores
+    if output.dtype != np.float32:
+        scale, zero_point = model_output_quant
+        output = (output.astype(np.float32) - zero_point) * scale
+
+    return float(output[0]), float(output[1])
+
 app = FastAPI(
     title="ModicAnalyzer Federated Learning Server - Production", 
     version="2.2",
@@ -88,8 +214,31 @@ stats = {
     "server_start_time": time.time()
 }
 
+# The version string only changes when an aggregation lands, so it is kept
+# pre-computed instead of re-deriving it on every request
+MODEL_VERSION_STR = str(stats.get("total_aggregations", 0))
+
 # TFLite-only server - no federated learning
 
+# Cache the model hash keyed on (mtime_ns, size) so the full SHA-256 walk only runs
+# when the file actually changes. hashlib.sha256 dispatches to OpenSSL's hardware
+# SHA path (SHA-NI) where available.
+_HASH_CACHE = {"key": None, "hash": None}
+
+
+def _model_hash():
+    """Return the SHA-256 of the TFLite model, re-hashing only when the file changes."""
+    st = TFLITE_MODEL.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    if key != _HASH_CACHE["key"]:
+        h = hashlib.sha256()
+        with open(TFLITE_MODEL, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        _HASH_CACHE["key"] = key
+        _HASH_CACHE["hash"] = h.hexdigest()
+    return _HASH_CACHE["hash"]
+
 
 @app.post("/predict")
 async def predict(
@@ -102,10 +251,8 @@ async def predict(
     Returns:
         JSON with prediction score, label, and processing metadata
     """
-    logger.info(f"📥 Prediction request received")
-    logger.info(f"   TensorFlow available: {tf_available}")
-    logger.info(f"   Model loaded: {prediction_interpreter is not None}")
-    
+    logger.info("📥 Prediction request received")
+
     if not tf_available:
         logger.error("❌ TensorFlow not available")
         raise HTTPException(
@@ -129,62 +276,20 @@ async def predict(
         if not file_t2.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="T2 file must be an image")
         
-        # Read and process images
-        t1_bytes = await file_t1.read()
-        t2_bytes = await file_t2.read()
-        
-        # Convert to PIL Images
-        t1_image = Image.open(io.BytesIO(t1_bytes)).convert('RGB')
-        t2_image = Image.open(io.BytesIO(t2_bytes)).convert('RGB')
+        # Read both upload bodies concurrently so their I/O waits overlap
+        t1_bytes, t2_bytes = await asyncio.gather(file_t1.read(), file_t2.read())
         
-        # Resize to model input size (224x224)
-        t1_resized = t1_image.resize((224, 224))
-        t2_resized = t2_image.resize((224, 224))
-        
-        # Convert to numpy arrays and normalize
-        t1_array = np.array(t1_resized, dtype=np.float32) / 255.0
-        t2_array = np.array(t2_resized, dtype=np.float32) / 255.0
-        
-        logger.info(f"🔍 Processing prediction: T1={file_t1.filename}, T2={file_t2.filename}")
-        
-        # Get input and output details
-        input_details = prediction_interpreter.get_input_details()
-        output_details = prediction_interpreter.get_output_details()
-        
-        logger.info(f"📊 Model input count: {len(input_details)}")
-        
-        # Run prediction with TFLite interpreter
-        if len(input_details) == 2:
-            # Dual input model - separate T1 and T2
-            t1_batch = np.expand_dims(t1_array, axis=0)
-            t2_batch = np.expand_dims(t2_array, axis=0)
-            
-            logger.info(f"📊 T1 input shape: {t1_batch.shape}, T2 input shape: {t2_batch.shape}")
-            
-            # Set input tensors
-            prediction_interpreter.set_tensor(input_details[0]['index'], t1_batch)
-            prediction_interpreter.set_tensor(input_details[1]['index'], t2_batch)
-        else:
-            # Single input model - use combined input
-            input_batch = np.expand_dims(np.stack([t1_array, t2_array], axis=0), axis=0)
-            logger.info(f"📊 Input shape: {input_batch.shape}")
-            prediction_interpreter.set_tensor(input_details[0]['index'], input_batch)
-        
-        # Run inference
-        prediction_interpreter.invoke()
+        # %-style args keep formatting lazy when INFO is filtered out
+        logger.info("🔍 Processing prediction: T1=%s, T2=%s", file_t1.filename, file_t2.filename)
+
+        # Decode, preprocessing and invoke() are all CPU-bound - run them on a
+        # worker thread so the event loop can keep serving other requests
+        no_modic_score, modic_score = await asyncio.to_thread(_run_inference, t1_bytes, t2_bytes)
         
-        # Get output
-        output = prediction_interpreter.get_tensor(output_details[0]['index'])[0]  # Remove batch dimension
-        no_modic_score = float(output[0])
-        modic_score = float(output[1])
-        
-        # Determine label and confidence
-        if modic_score > no_modic_score:
-            label = "Modic"
-            confidence = modic_score
-        else:
-            label = "No Modic"
-            confidence = no_modic_score
+        # Branchless label/confidence selection
+        idx = int(modic_score > no_modic_score)
+        label = _LABELS[idx]
+        confidence = (no_modic_score, modic_score)[idx]
         
         processing_time = int((time.time() - start_time) * 1000)  # ms
         
@@ -197,14 +302,14 @@ async def predict(
                 "modic": modic_score
             },
             "processing_time_ms": processing_time,
-            "model_version": str(stats.get("total_aggregations", 0)),
+            "model_version": MODEL_VERSION_STR,
             "input_files": {
                 "t1": file_t1.filename,
                 "t2": file_t2.filename
             }
         }
         
-        logger.info(f"✅ Prediction completed: {label} ({confidence:.3f}) in {processing_time}ms")
+        logger.info("✅ Prediction completed: %s (%.3f) in %dms", label, confidence, processing_time)
         return result
         
     except Exception as e:
@@ -215,20 +320,17 @@ async def predict(
 @app.get("/model_info")
 def get_model_info():
     """Get model metadata for client-side update checking."""
-    import hashlib
-    
     if not TFLITE_MODEL.exists():
         raise HTTPException(status_code=404, detail="No .tflite model available yet.")
-    
-    # Calculate file hash for change detection
-    with open(TFLITE_MODEL, 'rb') as f:
-        file_hash = hashlib.sha256(f.read()).hexdigest()
-    
+
+    # Cached file hash for change detection
+    file_hash = _model_hash()
+
     file_stats = TFLITE_MODEL.stat()
     
     return {
         "model_hash": file_hash,
-        "model_version": str(stats.get("total_aggregations", 0)),
+        "model_version": MODEL_VERSION_STR,
         "model_size_bytes": file_stats.st_size,
         "model_size_mb": round(file_stats.st_size / (1024*1024), 2),
         "last_modified": file_stats.st_mtime,
@@ -243,22 +345,23 @@ def get_global_model():
     if not TFLITE_MODEL.exists():
         raise HTTPException(status_code=404, detail="No global .tflite model available yet. Run aggregation first.")
     
-    # Calculate hash for verification
-    import hashlib
-    with open(TFLITE_MODEL, 'rb') as f:
-        file_hash = hashlib.sha256(f.read()).hexdigest()
-    
+    # Cached hash plus a single stat; FileResponse streams via os.sendfile on Linux,
+    # so the download path touches the file exactly once (kernel-side zero-copy)
+    file_hash = _model_hash()
+    model_size = TFLITE_MODEL.stat().st_size
+
     # Log download
-    logger.info(f"📥 Global model downloaded: {TFLITE_MODEL.stat().st_size} bytes")
-    
+    logger.info(f"📥 Global model downloaded: {model_size} bytes")
+
     return FileResponse(
-        str(TFLITE_MODEL), 
-        media_type="application/octet-stream", 
+        str(TFLITE_MODEL),
+        media_type="application/octet-stream",
         filename="modic_model.tflite",
         headers={
-            "Model-Version": "0",
+            "Model-Version": MODEL_VERSION_STR,
             "Model-Hash": file_hash,
-            "Model-Size": str(TFLITE_MODEL.stat().st_size)
+            "Model-Size": str(model_size),
+            "Content-Length": str(model_size)
         }
     )
 
@@ -371,4 +474,8 @@ if __name__ == "__main__":
     # Run with: uvicorn main:app --host 0.0.0.0 --port 8000
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Export the worker count before spawning so each worker's interpreter
+    # setup (tflite_threads above) sees it and caps its thread pool
+    workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count())
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
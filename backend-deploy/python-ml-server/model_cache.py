@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Process-lifetime cache for the global Keras model.
+
+Loading final_model.keras costs seconds of archive parsing and weight copies.
+Anything that runs several aggregation or setup steps in one process should
+pay that once per model file, not once per call.
+"""
+
+import functools
+from pathlib import Path
+
+
+@functools.lru_cache(maxsize=1)
+def _load(path, mtime_ns):
+    # Deferred import so merely importing this module stays cheap
+    import tensorflow as tf
+
+    # compile=False skips rebuilding optimizer state the server never uses,
+    # saving both load time and memory
+    return tf.keras.models.load_model(path, compile=False)
+
+
+def get_keras_model(model_path):
+    """Return the cached Keras model for model_path.
+
+    The cache is keyed on (path, mtime_ns), so the model is only reloaded when
+    the file changes - e.g. after an aggregation round writes a new one. The
+    old entry is evicted, letting its weights be freed.
+    """
+    st = Path(model_path).stat()
+    return _load(str(model_path), st.st_mtime_ns)
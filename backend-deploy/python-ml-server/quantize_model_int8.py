@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Post-training INT8 quantization for the Modic TFLite model.
+
+Full-integer quantization shrinks the model ~4x and lets XNNPACK/ruy dispatch
+to the int8 dot-product instructions (VNNI on x86, sdot on ARM). Run this
+offline and verify accuracy parity against the float model before shipping
+the quantized file as modic_model.tflite.
+"""
+
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+
+# Paths
+BACKEND_DIR = Path(__file__).parent
+KERAS_MODEL_PATH = BACKEND_DIR / "final_model.keras"
+INT8_MODEL_PATH = BACKEND_DIR / "modic_model_int8.tflite"
+CALIBRATION_DIR = BACKEND_DIR / "calibration_samples"
+
+NUM_CALIBRATION_SAMPLES = 100
+
+
+def representative_dataset():
+    """Yield calibration samples for the quantizer (real T1/T2 images preferred)."""
+    image_paths = sorted(CALIBRATION_DIR.glob("*.png")) + sorted(CALIBRATION_DIR.glob("*.jpg")) \
+        if CALIBRATION_DIR.exists() else []
+
+    if image_paths:
+        from PIL import Image
+        print(f"📊 Calibrating with {min(len(image_paths), NUM_CALIBRATION_SAMPLES)} real samples")
+        for path in image_paths[:NUM_CALIBRATION_SAMPLES]:
+            img = Image.open(path).convert('RGB').resize((224, 224))
+            arr = np.asarray(img, dtype=np.float32)[None, ...] / 255.0
+            yield [arr, arr]
+    else:
+        print("⚠️ No calibration samples found - using random data (accuracy will suffer)")
+        rng = np.random.default_rng(0)
+        for _ in range(NUM_CALIBRATION_SAMPLES):
+            sample = rng.random((1, 224, 224, 3), dtype=np.float32)
+            yield [sample, sample]
+
+
+def quantize_to_int8():
+    """Convert the Keras model to a full-integer uint8 TFLite model"""
+    print("🚀 INT8 Post-Training Quantization")
+    print("=" * 50)
+
+    if not KERAS_MODEL_PATH.exists():
+        print(f"❌ Keras model not found: {KERAS_MODEL_PATH}")
+        return False
+
+    model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+    print(f"✅ Keras model loaded: {model.input_shape} -> {model.output_shape}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # uint8 I/O lets the server feed raw pixel bytes with no float conversion
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+
+    tflite_model = converter.convert()
+
+    with open(INT8_MODEL_PATH, "wb") as f:
+        f.write(tflite_model)
+
+    size_mb = len(tflite_model) / (1024 * 1024)
+    print(f"✅ INT8 model written: {INT8_MODEL_PATH} ({size_mb:.2f} MB)")
+    return True
+
+
+def validate_int8_model():
+    """Smoke-test the quantized model with dummy uint8 inputs"""
+    print("\n🧪 Validating quantized model...")
+
+    interpreter = tf.lite.Interpreter(model_path=str(INT8_MODEL_PATH))
+    interpreter.allocate_tensors()
+
+    input_details = interpreter.get_input_details()
+    output_details = interpreter.get_output_details()
+
+    rng = np.random.default_rng(0)
+    for detail in input_details:
+        dummy = rng.integers(0, 256, size=detail['shape'], dtype=np.uint8)
+        interpreter.set_tensor(detail['index'], dummy)
+
+    interpreter.invoke()
+
+    output = interpreter.get_tensor(output_details[0]['index'])
+    scale, zero_point = output_details[0]['quantization']
+    scores = (output.astype(np.float32) - zero_point) * scale if scale else output
+
+    print(f"   Input dtype: {input_details[0]['dtype']}")
+    print(f"   Output dtype: {output_details[0]['dtype']}")
+    print(f"   Dequantized scores: {scores}")
+    print("✅ Validation passed")
+    return True
+
+
+if __name__ == "__main__":
+    if quantize_to_int8():
+        validate_int8_model()
+        print("\n📋 Next steps:")
+        print("   1. Compare predictions against the float model on a held-out set")
+        print("   2. Replace modic_model.tflite with the int8 file once parity is confirmed")
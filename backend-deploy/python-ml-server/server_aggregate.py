@@ -1,3 +1,8 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import tensorflow as tf
 from pathlib import Path
@@ -6,11 +11,49 @@ from typing import List
 # Global model paths
 GLOBAL_MODEL_KERAS = "final_model.keras"
 GLOBAL_MODEL_TFLITE = "global_model.tflite"
+MODEL_MANIFEST = "model_manifest.json"
+
+# Per-key averaging is independent pure-NumPy work that releases the GIL, so a
+# shared pool lets the reductions saturate memory bandwidth across cores
+_AGG_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+def _weights_hash(weight_dicts: List[dict]) -> str:
+    """SHA-256 over the raw bytes of every client weight array, in key order."""
+    h = hashlib.sha256()
+    for weights in weight_dicts:
+        for k in sorted(weights.keys()):
+            h.update(k.encode())
+            h.update(np.ascontiguousarray(weights[k]).view(np.uint8))
+    return h.hexdigest()
+
+
+def _read_last_aggregation_hash(manifest_path: str = MODEL_MANIFEST) -> str:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f).get("last_aggregation_hash", "")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return ""
+
+
+def _write_last_aggregation_hash(digest: str, manifest_path: str = MODEL_MANIFEST):
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    manifest["last_aggregation_hash"] = digest
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
 
 
 def load_npz(path: str):
-    """Load a .npz and return a dict of arrays."""
-    with np.load(path, allow_pickle=False) as data:
+    """Load a .npz and return a dict of arrays.
+
+    mmap_mode only takes effect for raw .npy files; zipped .npz members are
+    still read through the archive, but only when indexed.
+    """
+    with np.load(path, mmap_mode='r', allow_pickle=False) as data:
         return {k: data[k] for k in data.files}
 
 
@@ -23,20 +66,32 @@ def aggregate_npz_files(input_paths: List[str], output_path: str):
     if not input_paths:
         raise ValueError("No input files provided")
 
-    loaded = [load_npz(p) for p in input_paths]
+    # NpzFile handles are lazy: nothing is read or decompressed until a key is
+    # indexed, so peak memory stays at one client's array per key instead of
+    # every client's full weight set.
+    handles = [np.load(p, allow_pickle=False) for p in input_paths]
+
+    try:
+        # ensure keys match
+        keys = list(handles[0].files)
+        for h in handles[1:]:
+            if list(h.files) != keys:
+                raise ValueError("Mismatch in keys across uploaded files")
 
-    # ensure keys match
-    keys = list(loaded[0].keys())
-    for d in loaded[1:]:
-        if list(d.keys()) != keys:
-            raise ValueError("Mismatch in keys across uploaded files")
+        def _reduce_key(k):
+            # Running in-place accumulator: O(weights) peak memory instead of the
+            # O(clients * weights) np.stack copy. float32 is Keras-native and halves
+            # the bytes moved compared to the old float64 upcast.
+            acc = handles[0][k].astype(np.float32, copy=True)
+            for h in handles[1:]:
+                acc += h[k]
+            acc *= 1.0 / len(handles)
+            return k, acc
 
-    averaged = {}
-    for k in keys:
-        arrays = [d[k].astype(np.float64) for d in loaded]
-        # stack and mean
-        stacked = np.stack(arrays, axis=0)
-        averaged[k] = np.mean(stacked, axis=0)
+        averaged = dict(_AGG_EXECUTOR.map(_reduce_key, keys))
+    finally:
+        for h in handles:
+            h.close()
 
     # save
     np.savez_compressed(output_path, **averaged)
@@ -84,39 +139,78 @@ def keras_federated_averaging(client_weights_list: List[dict], global_model_path
     return model
 
 
-def convert_keras_to_tflite(keras_model_path: str = GLOBAL_MODEL_KERAS, 
-                           tflite_output_path: str = GLOBAL_MODEL_TFLITE):
+def _random_representative_dataset(input_shape, num_samples: int = 100):
+    """Fallback calibration generator: random float32 samples shaped like the
+    model input. Real training data gives better int8 ranges; pass it via the
+    representative_dataset argument when available."""
+    shape = (1,) + tuple(d if d is not None else 1 for d in input_shape[1:])
+    rng = np.random.default_rng(0)
+
+    def gen():
+        for _ in range(num_samples):
+            yield [rng.random(shape, dtype=np.float32)]
+
+    return gen
+
+
+def convert_keras_to_tflite(keras_model_path: str = GLOBAL_MODEL_KERAS,
+                           tflite_output_path: str = GLOBAL_MODEL_TFLITE,
+                           quantize: str = "float16",
+                           representative_dataset=None,
+                           model=None):
     """
     Convert the updated .keras model to .tflite for client download.
-    
+
     Args:
         keras_model_path: Path to the Keras model
         tflite_output_path: Output path for the .tflite model
-        
+        quantize: "float16" (default, ~2x smaller), "int8" (full-integer
+            post-training quantization, ~4x smaller and faster on CPU), or
+            "none" for plain float32
+        representative_dataset: calibration generator for the int8 path;
+            random samples are used when omitted
+        model: already-loaded Keras model; passing one skips the disk
+            round-trip through keras_model_path entirely
+
     Returns:
         Path to the generated .tflite file
     """
-    if not Path(keras_model_path).exists():
-        raise FileNotFoundError(f"Keras model not found: {keras_model_path}")
-    
-    # Load the Keras model
-    model = tf.keras.models.load_model(keras_model_path)
-    
+    if model is None:
+        if not Path(keras_model_path).exists():
+            raise FileNotFoundError(f"Keras model not found: {keras_model_path}")
+        model = tf.keras.models.load_model(keras_model_path)
+
     # Convert to TensorFlow Lite
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    
-    # Optimization settings (optional)
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    converter.target_spec.supported_types = [tf.float16]  # Use float16 for smaller size
-    
+
+    if quantize == "int8":
+        # Full-integer PTQ: weights and activations become int8, which also
+        # needs a calibration pass over representative inputs. I/O stays uint8
+        # to match quantize_model_int8.py and the serving path in main.py,
+        # which copies raw uint8 pixels straight into the input buffers.
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if representative_dataset is None:
+            representative_dataset = _random_representative_dataset(model.input_shape)
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]  # Use float16 for smaller size
+    # "none": leave weights in float32
+
     tflite_model = converter.convert()
-    
-    # Save the .tflite model
+
+    # Size and digest come from the in-memory flatbuffer, so the single write
+    # below is the only disk I/O this conversion performs
+    digest = hashlib.sha256(tflite_model).hexdigest()
     with open(tflite_output_path, "wb") as f:
         f.write(tflite_model)
-    
-    print(f"Converted model to .tflite: {tflite_output_path} ({len(tflite_model)} bytes)")
-    
+
+    print(f"Converted model to .tflite ({quantize}): {tflite_output_path} "
+          f"({len(tflite_model)} bytes, sha256 {digest[:16]}...)")
+
     return tflite_output_path
 
 
@@ -142,11 +236,36 @@ def hybrid_fl_aggregation(input_paths: List[str],
     
     # Step 1: Load client weights
     client_weights = [load_npz(path) for path in input_paths]
-    
-    # Step 2: Aggregate using Keras (for now, using existing logic)
+
+    # Step 2: Short-circuit when the inputs are identical to the previous round -
+    # the multi-second model save + TFLite converter run would produce the same bytes
+    digest = _weights_hash(client_weights)
+    if (digest == _read_last_aggregation_hash()
+            and Path(keras_output_path).exists()
+            and Path(tflite_output_path).exists()):
+        print("Aggregated weights unchanged - skipping model save and TFLite conversion")
+        return keras_output_path, tflite_output_path
+
+    # Step 3: Aggregate using Keras (for now, using existing logic)
     model = keras_federated_averaging(client_weights, keras_output_path)
-    
-    # Step 3: Convert to .tflite
-    tflite_path = convert_keras_to_tflite(keras_output_path, tflite_output_path)
-    
+
+    # Step 4: Convert to .tflite, handing over the in-memory model so the
+    # converter doesn't reload the file that was just saved
+    tflite_path = convert_keras_to_tflite(keras_output_path, tflite_output_path,
+                                          model=model)
+
+    _write_last_aggregation_hash(digest)
+
     return keras_output_path, tflite_path
+
+
+if __name__ == "__main__":
+    # CLI entry so conversion can run in a clean subprocess whose TF-tuning
+    # env vars (OneDNN, thread counts) are set before TensorFlow is imported:
+    #   python server_aggregate.py [keras_in] [tflite_out] [quantize]
+    import sys
+
+    _keras_in = sys.argv[1] if len(sys.argv) > 1 else GLOBAL_MODEL_KERAS
+    _tflite_out = sys.argv[2] if len(sys.argv) > 2 else GLOBAL_MODEL_TFLITE
+    _quantize = sys.argv[3] if len(sys.argv) > 3 else "float16"
+    convert_keras_to_tflite(_keras_in, _tflite_out, quantize=_quantize)
@@ -4,11 +4,24 @@ Production Model Initialization Script
 Ensures models are properly aligned between server (.keras) and client (.tflite)
 """
 
-import tensorflow as tf
+import os
+
+# Quiet TF logging and keep this CPU-only conversion script off the GPU;
+# must be set before tensorflow is first imported
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+import subprocess
+import sys
+
 import numpy as np
 from pathlib import Path
 import shutil
-from server_aggregate import convert_keras_to_tflite
+
+try:
+    import orjson  # C-level JSON writer; stdlib json is the fallback
+except ImportError:
+    orjson = None
 
 # Paths
 BACKEND_DIR = Path(__file__).parent
@@ -18,26 +31,37 @@ TFLITE_MODEL_PATH = BACKEND_DIR / "global_model.tflite"
 CLIENT_MODEL_PATH = APP_ASSETS_DIR / "modic_model.tflite"
 
 def verify_model_compatibility():
-    """Verify that Keras and TFLite models are compatible"""
+    """Verify that Keras and TFLite models are compatible.
+
+    Returns the loaded Keras model on success so callers can reuse it instead
+    of paying a second multi-hundred-MB load, or None on failure.
+    """
     print("🔍 Verifying model compatibility...")
-    
+
+    # Deferred: importing TF costs seconds, so only pay it when models exist
+    import tensorflow as tf
+
     if not KERAS_MODEL_PATH.exists():
         print(f"❌ Keras model not found: {KERAS_MODEL_PATH}")
-        return False
+        return None
     
     if not CLIENT_MODEL_PATH.exists():
         print(f"❌ Client TFLite model not found: {CLIENT_MODEL_PATH}")
-        return False
+        return None
     
     try:
-        # Load Keras model
-        keras_model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+        # Load Keras model through the process-wide cache so later steps
+        # (and repeated rounds in the same process) reuse the loaded weights
+        from model_cache import get_keras_model
+        keras_model = get_keras_model(KERAS_MODEL_PATH)
         print(f"✅ Keras model loaded: {keras_model.input_shape} -> {keras_model.output_shape}")
         
-        # Load TFLite model
-        interpreter = tf.lite.Interpreter(model_path=str(CLIENT_MODEL_PATH))
-        interpreter.allocate_tensors()
-        
+        # Load TFLite model. No allocate_tensors() here: get_*_details() read
+        # the static shapes from the flatbuffer, so skipping allocation avoids
+        # building the whole tensor arena just to introspect shapes.
+        interpreter = tf.lite.Interpreter(model_path=str(CLIENT_MODEL_PATH),
+                                          num_threads=os.cpu_count())
+
         input_details = interpreter.get_input_details()
         output_details = interpreter.get_output_details()
         
@@ -52,29 +76,66 @@ def verify_model_compatibility():
         else:
             print(f"⚠️ Input shape mismatch: Keras {keras_input_shape} vs TFLite {tflite_input_shape}")
         
-        return True
+        return keras_model
         
     except Exception as e:
         print(f"❌ Model verification failed: {e}")
-        return False
+        return None
 
 def initialize_global_tflite():
-    """Initialize global TFLite model from Keras model"""
+    """Initialize global TFLite model from Keras model.
+
+    Runs the conversion in a subprocess so the TF tuning env vars below are in
+    place before TensorFlow is imported (they are ignored after import), and
+    so the converter's memory pool dies with the child instead of bloating
+    this process.
+    """
     print("🚀 Initializing global TFLite model...")
-    
+
+    # int8 PTQ can regress accuracy on some ops, so it stays opt-in via env
+    # (TFLITE_QUANTIZE=int8); the default remains float16
+    quantize = os.getenv("TFLITE_QUANTIZE", "float16")
+
+    env = {**os.environ,
+           "TF_ENABLE_ONEDNN_OPTS": "1",
+           "TF_CPP_MIN_LOG_LEVEL": "2",
+           "OMP_NUM_THREADS": str(os.cpu_count())}
+
     try:
         # Convert Keras to TFLite for global distribution
-        tflite_path = convert_keras_to_tflite(
-            str(KERAS_MODEL_PATH), 
-            str(TFLITE_MODEL_PATH)
+        result = subprocess.run(
+            [sys.executable, str(BACKEND_DIR / "server_aggregate.py"),
+             str(KERAS_MODEL_PATH), str(TFLITE_MODEL_PATH), quantize],
+            env=env, cwd=BACKEND_DIR
         )
-        print(f"✅ Global TFLite model created: {tflite_path}")
+        if result.returncode != 0:
+            print(f"❌ TFLite conversion exited with code {result.returncode}")
+            return False
+        print(f"✅ Global TFLite model created: {TFLITE_MODEL_PATH}")
         return True
-        
+
     except Exception as e:
         print(f"❌ Failed to create global TFLite model: {e}")
         return False
 
+def fast_copy(src, dst):
+    """Copy src to dst with an in-kernel copy_file_range loop when available.
+
+    Falls back to shutil.copy2 (which already uses sendfile on Linux) when the
+    syscall is missing or can't bridge the two filesystems. Metadata is
+    preserved either way, matching the old copy2 behavior.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                while os.copy_file_range(s.fileno(), d.fileno(), 1 << 20) > 0:
+                    pass
+            shutil.copystat(src, dst)
+            return
+        except OSError:
+            pass  # e.g. EXDEV when src and dst sit on different filesystems
+    shutil.copy2(src, dst)
+
 def sync_client_model():
     """Sync the client model with the current global model"""
     print("🔄 Syncing client model with global model...")
@@ -87,12 +148,12 @@ def sync_client_model():
         # Backup original client model
         backup_path = CLIENT_MODEL_PATH.with_suffix('.tflite.backup')
         if CLIENT_MODEL_PATH.exists() and not backup_path.exists():
-            shutil.copy2(CLIENT_MODEL_PATH, backup_path)
+            fast_copy(CLIENT_MODEL_PATH, backup_path)
             print(f"📦 Backed up original client model to: {backup_path}")
         
         # Copy global model to client assets
         APP_ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(TFLITE_MODEL_PATH, CLIENT_MODEL_PATH)
+        fast_copy(TFLITE_MODEL_PATH, CLIENT_MODEL_PATH)
         
         print(f"✅ Client model synced: {CLIENT_MODEL_PATH}")
         return True
@@ -101,32 +162,44 @@ def sync_client_model():
         print(f"❌ Failed to sync client model: {e}")
         return False
 
-def create_model_manifest():
-    """Create a manifest file with model information"""
+def _file_info(path, base):
+    """One stat syscall per manifest entry: exists() + stat() each hit the
+    filesystem, so a single try/stat answers both questions."""
+    try:
+        st = path.stat()
+        return {
+            "path": str(path.relative_to(base)),
+            "exists": True,
+            "size_mb": round(st.st_size / (1024*1024), 2)
+        }
+    except FileNotFoundError:
+        return {"path": str(path.relative_to(base)), "exists": False, "size_mb": 0}
+
+def create_model_manifest(keras_model=None):
+    """Create a manifest file with model information.
+
+    Pass an already-loaded Keras model to skip reloading it from disk.
+    """
     print("📋 Creating model manifest...")
-    
+
     manifest = {
-        "keras_model": {
-            "path": str(KERAS_MODEL_PATH.relative_to(BACKEND_DIR)),
-            "exists": KERAS_MODEL_PATH.exists(),
-            "size_mb": round(KERAS_MODEL_PATH.stat().st_size / (1024*1024), 2) if KERAS_MODEL_PATH.exists() else 0
-        },
-        "global_tflite": {
-            "path": str(TFLITE_MODEL_PATH.relative_to(BACKEND_DIR)),
-            "exists": TFLITE_MODEL_PATH.exists(),
-            "size_mb": round(TFLITE_MODEL_PATH.stat().st_size / (1024*1024), 2) if TFLITE_MODEL_PATH.exists() else 0
-        },
-        "client_tflite": {
-            "path": str(CLIENT_MODEL_PATH.relative_to(BACKEND_DIR.parent)),
-            "exists": CLIENT_MODEL_PATH.exists(),
-            "size_mb": round(CLIENT_MODEL_PATH.stat().st_size / (1024*1024), 2) if CLIENT_MODEL_PATH.exists() else 0
-        }
+        "keras_model": _file_info(KERAS_MODEL_PATH, BACKEND_DIR),
+        "global_tflite": _file_info(TFLITE_MODEL_PATH, BACKEND_DIR),
+        "client_tflite": _file_info(CLIENT_MODEL_PATH, BACKEND_DIR.parent)
     }
-    
+    # Distribution format the tflite models were converted with; float16 is
+    # the default because it halves download size with near-zero accuracy cost
+    # and feeds Android GPU delegates natively
+    manifest["global_tflite"]["quantization"] = os.getenv("TFLITE_QUANTIZE", "float16")
+
     # Get model details if available
-    if KERAS_MODEL_PATH.exists():
+    if manifest["keras_model"]["exists"]:
         try:
-            model = tf.keras.models.load_model(KERAS_MODEL_PATH)
+            if keras_model is not None:
+                model = keras_model
+            else:
+                from model_cache import get_keras_model
+                model = get_keras_model(KERAS_MODEL_PATH)
             manifest["keras_model"]["input_shape"] = str(model.input_shape)
             manifest["keras_model"]["output_shape"] = str(model.output_shape)
             manifest["keras_model"]["parameters"] = int(model.count_params())
@@ -134,9 +207,12 @@ def create_model_manifest():
             manifest["keras_model"]["error"] = str(e)
     
     manifest_path = BACKEND_DIR / "model_manifest.json"
-    import json
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    if orjson is not None:
+        manifest_path.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    else:
+        import json
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
     
     print(f"✅ Model manifest created: {manifest_path}")
     return manifest
@@ -146,8 +222,9 @@ def production_model_setup():
     print("🏭 Production Model Setup")
     print("=" * 50)
     
-    # Step 1: Verify existing models
-    if not verify_model_compatibility():
+    # Step 1: Verify existing models (keeping the loaded Keras model for reuse)
+    keras_model = verify_model_compatibility()
+    if keras_model is None:
         print("❌ Model verification failed")
         return False
     
@@ -163,8 +240,8 @@ def production_model_setup():
     else:
         print("⚠️ Client model sync failed (using existing)")
     
-    # Step 4: Create manifest
-    manifest = create_model_manifest()
+    # Step 4: Create manifest, reusing the model loaded during verification
+    manifest = create_model_manifest(keras_model=keras_model)
     
     # Step 5: Summary
     print("\n📊 Production Setup Summary:")
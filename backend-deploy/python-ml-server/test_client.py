@@ -5,15 +5,37 @@ Simulates multiple clients training locally and uploading weight updates.
 """
 
 import numpy as np
+import os
+import pickle
 import requests
 import time
 import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import tempfile
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Opt-in zstd weight serialization (requires the server to read .zst too);
+# the wire format stays .npz by default because that's what /upload_weights
+# and server_aggregate consume today.
+USE_ZSTD = os.getenv("FL_USE_ZSTD", "").lower() in ("1", "true", "yes") and zstandard is not None
 
 # Backend server URL
 SERVER_URL = "https://modic-fl-server.onrender.com"  # Your live Render server
 
+# Shared pooled session: all client calls reuse one TCP+TLS connection instead
+# of re-handshaking per request
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                      max_retries=Retry(total=3, backoff_factor=0.3)))
+
 def create_dummy_weights(layer_shapes=None):
     """Create dummy model weights to simulate a trained model."""
     if layer_shapes is None:
@@ -27,68 +49,136 @@ def create_dummy_weights(layer_shapes=None):
             'output_bias': (10,)             # Output bias
         }
     
+    # One float32 Generator draw into a flat buffer plus per-layer views: avoids
+    # six separate legacy-RNG allocations and the float64 -> float32 cast
+    rng = np.random.default_rng()
+    sizes = [int(np.prod(shape)) for shape in layer_shapes.values()]
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    buf = rng.standard_normal(int(offsets[-1]), dtype=np.float32)
+    buf *= 0.1  # same std-dev as the old np.random.normal(0, 0.1, ...)
+
     weights = {}
-    for name, shape in layer_shapes.items():
-        # Add some random noise to simulate training differences
-        weights[name] = np.random.normal(0, 0.1, shape).astype(np.float32)
-    
+    for i, (name, shape) in enumerate(layer_shapes.items()):
+        weights[name] = buf[offsets[i]:offsets[i + 1]].reshape(shape)
+
     return weights
 
 def save_weights_to_npz(weights, filepath):
-    """Save weights dictionary to .npz file."""
-    np.savez_compressed(filepath, **weights)
+    """Save weights dictionary to .npz file.
+
+    Written uncompressed (ZIP_STORED): float32 noise is essentially
+    incompressible, so savez_compressed burned zlib CPU for ~0% size win.
+    The result is still a regular .npz that np.load understands.
+    """
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_STORED) as zf:
+        for name, arr in weights.items():
+            with zf.open(name + '.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(arr), allow_pickle=False)
+
+def save_weights_to_zst(weights, filepath):
+    """Save weights as a zstd frame: 4-byte header length, pickled header of
+    (dtype, shape, offset, nbytes) per layer, then the compressed flat buffer.
+
+    zstd level 1 with threads=-1 compresses 3-5x faster than the zlib pass in
+    np.savez_compressed at a comparable ratio. Only used when USE_ZSTD is set.
+    """
+    header = {}
+    chunks = []
+    offset = 0
+    for name, arr in weights.items():
+        arr = np.ascontiguousarray(arr)
+        header[name] = (arr.dtype.str, arr.shape, offset, arr.nbytes)
+        chunks.append(arr.tobytes())
+        offset += arr.nbytes
+
+    header_bytes = pickle.dumps(header)
+    cctx = zstandard.ZstdCompressor(level=1, threads=-1, write_content_size=True)
+    with open(filepath, 'wb') as f:
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        f.write(cctx.compress(b''.join(chunks)))
+
+def load_weights_from_zst(filepath):
+    """Inverse of save_weights_to_zst."""
+    with open(filepath, 'rb') as f:
+        header_len = int.from_bytes(f.read(4), 'little')
+        header = pickle.loads(f.read(header_len))
+        flat = zstandard.ZstdDecompressor().decompress(f.read())
+    return {name: np.frombuffer(flat, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                                offset=offset).reshape(shape)
+            for name, (dtype, shape, offset, nbytes) in header.items()}
 
 def load_weights_from_npz(filepath):
     """Load weights from .npz file."""
     with np.load(filepath) as data:
         return {k: data[k] for k in data.files}
 
+def save_weights(weights, filepath):
+    """Save weights in the configured format: zstd when FL_USE_ZSTD is set
+    (and zstandard is installed), the default .npz otherwise."""
+    if USE_ZSTD:
+        save_weights_to_zst(weights, filepath)
+    else:
+        save_weights_to_npz(weights, filepath)
+
 def upload_weights(client_id, weights_file):
     """Upload weights file to the server."""
     url = f"{SERVER_URL}/upload_weights"
-    
+
     with open(weights_file, 'rb') as f:
-        files = {'file': ('weights.npz', f, 'application/octet-stream')}
+        files = {'file': ('weights' + Path(weights_file).suffix, f, 'application/octet-stream')}
         data = {'client_id': client_id}
         
-        response = requests.post(url, files=files, data=data)
+        response = SESSION.post(url, files=files, data=data)
         return response.json()
 
 def download_latest_weights(save_path):
-    """Download the latest aggregated weights from the server."""
+    """Download the latest aggregated weights from the server.
+
+    Streamed to disk in 1 MiB chunks so the payload never has to be buffered
+    whole in memory.
+    """
     url = f"{SERVER_URL}/latest_weights"
-    
-    response = requests.get(url)
-    if response.status_code == 200:
+
+    with SESSION.get(url, stream=True) as response:
+        if response.status_code != 200:
+            return False
         with open(save_path, 'wb') as f:
-            f.write(response.content)
-        return True
-    return False
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    return True
 
 def trigger_aggregation():
     """Trigger aggregation on the server."""
     url = f"{SERVER_URL}/aggregate"
-    response = requests.post(url)
+    response = SESSION.post(url)
     return response.json()
 
 def get_server_status():
     """Get server status."""
     url = f"{SERVER_URL}/status"
-    response = requests.get(url)
+    response = SESSION.get(url)
     return response.json()
 
 def simulate_local_training(base_weights, client_id, num_epochs=5):
     """Simulate local training by adding noise to weights."""
     print(f"Client {client_id}: Simulating {num_epochs} epochs of local training...")
     
-    # Simulate training by adding small random updates
+    # Simulate training with one flat float32 noise draw scaled in place, then
+    # per-layer views - no per-layer RNG calls or float64 temporaries
+    learning_rate = 0.01
+    rng = np.random.default_rng()
+    total_size = sum(weight.size for weight in base_weights.values())
+    noise = rng.standard_normal(total_size, dtype=np.float32)
+    noise *= learning_rate * 0.01  # gradient std-dev scaled by the learning rate
+
     trained_weights = {}
+    offset = 0
     for name, weight in base_weights.items():
-        # Simulate gradient updates with small learning rate
-        learning_rate = 0.01
-        gradient = np.random.normal(0, 0.01, weight.shape)
-        trained_weights[name] = weight + learning_rate * gradient
-    
+        end = offset + weight.size
+        trained_weights[name] = weight + noise[offset:end].reshape(weight.shape)
+        offset = end
+
     return trained_weights
 
 def main():
@@ -110,31 +200,31 @@ def main():
     
     # Simulate multiple clients
     num_clients = 3
-    client_updates = []
-    
-    print(f"\n👥 Simulating {num_clients} clients...")
-    
-    for i in range(num_clients):
+
+    def run_one_client(i):
+        """Train and upload one simulated client; returns its id on success."""
         client_id = f"client_{i+1}_{uuid.uuid4().hex[:8]}"
-        print(f"\n🔄 Client {i+1} ({client_id}):")
-        
+        print(f"🔄 Client {i+1} ({client_id}): starting")
+
         # Simulate local training
         trained_weights = simulate_local_training(base_weights, client_id)
-        
+
         # Save weights to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.npz', delete=False) as tmp:
+        suffix = '.zst' if USE_ZSTD else '.npz'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
             tmp_path = tmp.name
-        
+
         try:
-            save_weights_to_npz(trained_weights, tmp_path)
-            
+            save_weights(trained_weights, tmp_path)
+
             # Upload to server
             try:
                 result = upload_weights(client_id, tmp_path)
-                print(f"  ✅ Upload successful: {result}")
-                client_updates.append(client_id)
+                print(f"  ✅ Client {i+1} upload successful: {result}")
+                return client_id
             except Exception as e:
-                print(f"  ❌ Upload failed: {e}")
+                print(f"  ❌ Client {i+1} upload failed: {e}")
+                return None
         finally:
             # Clean up temp file
             try:
@@ -147,7 +237,17 @@ def main():
                     Path(tmp_path).unlink()
                 except:
                     print(f"  ⚠️ Could not delete temp file: {tmp_path}")
-    
+
+    print(f"\n👥 Simulating {num_clients} clients concurrently...")
+
+    # Uploads are network-bound, so overlapping them via a thread pool cuts the
+    # wall time to roughly one round trip; the pooled SESSION is thread-safe
+    # for distinct requests. Aggregation only fires once every future is done.
+    with ThreadPoolExecutor(max_workers=num_clients) as ex:
+        futures = [ex.submit(run_one_client, i) for i in range(num_clients)]
+        client_updates = [f.result() for f in as_completed(futures)]
+    client_updates = [c for c in client_updates if c is not None]
+
     print(f"\n📈 All clients uploaded. Total updates: {len(client_updates)}")
     
     # Trigger aggregation
@@ -170,12 +270,21 @@ def main():
             aggregated_weights = load_weights_from_npz(aggregated_file)
             print(f"📊 Aggregated model has {len(aggregated_weights)} layers")
             
-            # Compare with original base weights
+            # Compare with original base weights: subtract each layer into one
+            # preallocated scratch buffer, then fold the squares per layer with
+            # a single reduceat - no per-layer diff temporaries or BLAS calls
             print("\n📈 Weight comparison (L2 norm differences):")
-            for name in base_weights.keys():
-                if name in aggregated_weights:
-                    diff = np.linalg.norm(aggregated_weights[name] - base_weights[name])
-                    print(f"  {name}: {diff:.6f}")
+            names = [n for n in base_weights if n in aggregated_weights]
+            sizes = [base_weights[n].size for n in names]
+            offsets = np.concatenate(([0], np.cumsum(sizes)))
+            scratch = np.empty(int(offsets[-1]), dtype=np.float32)
+            for name, off, size in zip(names, offsets, sizes):
+                np.subtract(aggregated_weights[name].ravel(), base_weights[name].ravel(),
+                            out=scratch[off:off + size])
+            scratch *= scratch
+            norms = np.sqrt(np.add.reduceat(scratch, offsets[:-1]))
+            for name, norm in zip(names, norms):
+                print(f"  {name}: {norm:.6f}")
             
         else:
             print("❌ Failed to download aggregated weights")
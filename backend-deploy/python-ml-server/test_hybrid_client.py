@@ -16,15 +16,22 @@ CLIENT_ID = "test_client_hybrid"
 
 def create_dummy_weights():
     """Create dummy client weights for testing"""
-    weights = {
-        "conv2d_kernel": np.random.randn(3, 3, 3, 32).astype(np.float32),
-        "conv2d_bias": np.random.randn(32).astype(np.float32),
-        "dense_kernel": np.random.randn(1568, 128).astype(np.float32),
-        "dense_bias": np.random.randn(128).astype(np.float32),
-        "output_kernel": np.random.randn(128, 10).astype(np.float32),
-        "output_bias": np.random.randn(10).astype(np.float32),
+    shapes = {
+        "conv2d_kernel": (3, 3, 3, 32),
+        "conv2d_bias": (32,),
+        "dense_kernel": (1568, 128),
+        "dense_bias": (128,),
+        "output_kernel": (128, 10),
+        "output_bias": (10,),
     }
-    return weights
+    # One float32 Generator draw plus per-layer views instead of six legacy
+    # np.random.randn allocations with float64 -> float32 casts
+    rng = np.random.default_rng()
+    sizes = [int(np.prod(shape)) for shape in shapes.values()]
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    buf = rng.standard_normal(int(offsets[-1]), dtype=np.float32)
+    return {name: buf[offsets[i]:offsets[i + 1]].reshape(shape)
+            for i, (name, shape) in enumerate(shapes.items())}
 
 def save_weights_as_npz(weights, filepath):
     """Save weights as .npz file"""
@@ -3,11 +3,37 @@
 Test script for model update functionality
 """
 
+import functools
 import requests
 import json
 import hashlib
 from pathlib import Path
 
+def sha256_file(path, chunk_size=1 << 20):
+    """Stream a file through SHA-256 without loading it into memory.
+
+    hashlib.file_digest (Python 3.11+) is preferred; both paths dispatch to
+    OpenSSL's hardware-accelerated SHA implementation.
+    """
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+        return h.hexdigest()
+
+@functools.lru_cache(maxsize=8)
+def _digest_for(path, mtime_ns, size):
+    """Hash the file; keying on (path, mtime_ns, size) makes repeat calls O(1)
+    stat lookups - only a real file change pays the full SHA pass again."""
+    return sha256_file(path)
+
+def file_digest_cached(path):
+    """mtime/size-memoized SHA-256 for polling-style callers."""
+    st = Path(path).stat()
+    return _digest_for(str(path), st.st_mtime_ns, st.st_size)
+
 def test_model_info_endpoint():
     """Test the new model_info endpoint"""
     
@@ -40,22 +66,31 @@ def test_model_download():
     base_url = "http://localhost:8000"
     
     try:
-        response = requests.get(f"{base_url}/get_global_model")
-        if response.status_code == 200:
+        with requests.get(f"{base_url}/get_global_model", stream=True) as response:
+            if response.status_code != 200:
+                print(f"❌ Model download failed: {response.status_code}")
+                return False
+
             # Get headers
             model_version = response.headers.get("Model-Version", "unknown")
             model_hash = response.headers.get("Model-Hash", "")
             model_size = response.headers.get("Model-Size", "0")
-            
+
             print(f"✅ Model Download:")
             print(f"   Version: {model_version}")
             print(f"   Hash: {model_hash[:16]}...")
             print(f"   Size: {int(model_size)/1024/1024:.2f} MB")
-            
-            # Verify downloaded content hash
-            downloaded_data = response.content
-            calculated_hash = hashlib.sha256(downloaded_data).hexdigest()
-            
+
+            # Hash and persist the body in the same streaming pass - the full
+            # model never has to sit in memory and the SHA work overlaps with
+            # the network transfer
+            h = hashlib.sha256()
+            with open("downloaded_global_model.tflite", "wb") as out:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    h.update(chunk)
+                    out.write(chunk)
+            calculated_hash = h.hexdigest()
+
             if calculated_hash == model_hash:
                 print(f"✅ Hash verification: PASSED")
             else:
@@ -64,9 +99,6 @@ def test_model_download():
                 print(f"   Calculated: {calculated_hash}")
             
             return True
-        else:
-            print(f"❌ Model download failed: {response.status_code}")
-            return False
     except Exception as e:
         print(f"⚠️ Model download: Server not running - {e}")
         return False
@@ -76,9 +108,8 @@ def verify_local_model():
     
     model_path = Path("modic_model.tflite")
     if model_path.exists():
-        with open(model_path, 'rb') as f:
-            local_hash = hashlib.sha256(f.read()).hexdigest()
-        
+        local_hash = file_digest_cached(model_path)
+
         size_mb = model_path.stat().st_size / (1024*1024)
         
         print(f"✅ Local Model:")
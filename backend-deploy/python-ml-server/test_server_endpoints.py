@@ -3,84 +3,112 @@
 Quick test of the updated server endpoints
 """
 
+import os
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# One pooled session for the endpoint probes: a single keep-alive connection
+# serves all three requests instead of a handshake each
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                       max_retries=Retry(total=2, backoff_factor=0.1))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+SESSION.headers.update({'Connection': 'keep-alive'})
+
+try:
+    from orjson import loads as _loads  # C-level parser, several times faster
+except ImportError:
+    from json import loads as _loads
+
+def _report_root(response):
+    if response.status_code == 200:
+        data = _loads(response.content)
+        print(f"✅ Root endpoint: {data['version']} - {data['architecture']}")
+        print(f"   Message: {data['message']}")
+    else:
+        print(f"❌ Root endpoint failed: {response.status_code}")
+
+def _report_health(response):
+    if response.status_code == 200:
+        data = _loads(response.content)
+        print(f"✅ Health check: {data['status']}")
+        print(f"   TFLite model loaded: {data['components']['prediction_model_loaded']}")
+        if 'model_info' in data:
+            print(f"   Model inputs: {data['model_info']['input_count']}")
+    else:
+        print(f"❌ Health endpoint failed: {response.status_code}")
+
+def _report_status(response):
+    if response.status_code == 200:
+        data = _loads(response.content)
+        print(f"✅ Status endpoint: {data['architecture']} v{data['version']}")
+        print(f"   TFLite model: {data['tflite_model_size_mb']:.1f} MB")
+        print(f"   Online inference: {data.get('features', {}).get('online_inference', False)}")
+    else:
+        print(f"❌ Status endpoint failed: {response.status_code}")
 
 def test_server_endpoints():
     """Test key server endpoints to verify TFLite migration"""
-    
+
     base_url = "http://localhost:8000"
-    
+
     print("🧪 Testing Server Endpoints")
     print("=" * 50)
-    
-    # Test root endpoint
-    try:
-        response = requests.get(f"{base_url}/")
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Root endpoint: {data['version']} - {data['architecture']}")
-            print(f"   Message: {data['message']}")
-        else:
-            print(f"❌ Root endpoint failed: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ Root endpoint: Server not running - {e}")
-    
-    # Test health endpoint
-    try:
-        response = requests.get(f"{base_url}/health")
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Health check: {data['status']}")
-            print(f"   TFLite model loaded: {data['components']['prediction_model_loaded']}")
-            if 'model_info' in data:
-                print(f"   Model inputs: {data['model_info']['input_count']}")
-        else:
-            print(f"❌ Health endpoint failed: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ Health endpoint: Server not running - {e}")
-    
-    # Test status endpoint  
+
+    # The three probes are independent, so firing them together collapses the
+    # wall time to one round trip; they share the pooled SESSION connection
+    formatters = {
+        "/": _report_root,
+        "/health": _report_health,
+        "/status": _report_status,
+    }
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futures = {ex.submit(SESSION.get, base_url + path, timeout=5): path
+                   for path in formatters}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                formatters[path](future.result())
+            except Exception as e:
+                print(f"⚠️ {path} endpoint: Server not running - {e}")
+
+def _size_mb(path):
+    """Size in MB, or None if missing - one stat syscall answers both the
+    exists() and st_size questions the old code asked separately."""
     try:
-        response = requests.get(f"{base_url}/status")
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Status endpoint: {data['architecture']} v{data['version']}")
-            print(f"   TFLite model: {data['tflite_model_size_mb']:.1f} MB")
-            print(f"   Online inference: {data.get('features', {}).get('online_inference', False)}")
-        else:
-            print(f"❌ Status endpoint failed: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ Status endpoint: Server not running - {e}")
+        return os.stat(path).st_size / (1024*1024)
+    except FileNotFoundError:
+        return None
 
 def check_local_files():
     """Check local file status"""
     print("\n📁 Local File Status")
     print("=" * 30)
-    
+
     backend_dir = Path(".")
-    
+
     # Check TFLite model
-    tflite_model = backend_dir / "modic_model.tflite"
-    if tflite_model.exists():
-        size_mb = tflite_model.stat().st_size / (1024*1024)
+    size_mb = _size_mb(backend_dir / "modic_model.tflite")
+    if size_mb is not None:
         print(f"✅ modic_model.tflite: {size_mb:.2f} MB")
     else:
         print("❌ modic_model.tflite: Not found")
-    
+
     # Check if old Keras model still exists
-    keras_model = backend_dir / "final_model.keras"
-    if keras_model.exists():
-        size_mb = keras_model.stat().st_size / (1024*1024)
+    size_mb = _size_mb(backend_dir / "final_model.keras")
+    if size_mb is not None:
         print(f"⚠️ final_model.keras still exists: {size_mb:.2f} MB (consider removing)")
     else:
         print("✅ final_model.keras: Removed (as intended)")
-    
+
     # Check global TFLite
-    global_tflite = backend_dir / "global_model.tflite"
-    if global_tflite.exists():
-        size_mb = global_tflite.stat().st_size / (1024*1024)
+    size_mb = _size_mb(backend_dir / "global_model.tflite")
+    if size_mb is not None:
         print(f"✅ global_model.tflite: {size_mb:.2f} MB")
     else:
         print("⚠️ global_model.tflite: Not found")
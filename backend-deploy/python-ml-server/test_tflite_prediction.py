@@ -3,69 +3,118 @@
 Test script to verify TFLite model prediction functionality
 """
 
+import os
+
 import numpy as np
-import tensorflow as tf
-from PIL import Image
-import io
+
+# Prefer the lightweight tflite_runtime wheel (near-instant import, a few MB
+# RSS); fall back to full tensorflow's bundled interpreter when it's absent
+try:
+    from tflite_runtime.interpreter import Interpreter, load_delegate
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+    load_delegate = tf.lite.experimental.load_delegate
+
+def _quantize_input(x, detail):
+    """Map a float32 array onto a quantized input tensor's int domain.
+
+    No-op for float models; for int8/uint8 models (e.g. the output of
+    quantize_model_int8.py) applies x/scale + zero_point with clipping.
+    """
+    if detail['dtype'] == np.float32:
+        return x
+    scale, zero_point = detail['quantization']
+    if scale == 0:
+        return x
+    info = np.iinfo(detail['dtype'])
+    return np.clip(np.round(x / scale + zero_point),
+                   info.min, info.max).astype(detail['dtype'])
+
+def _dequantize_output(output, detail):
+    """Inverse mapping for quantized outputs back to float32 scores."""
+    if output.dtype == np.float32:
+        return output
+    scale, zero_point = detail['quantization']
+    if scale == 0:
+        return output.astype(np.float32)
+    return (output.astype(np.float32) - zero_point) * scale
 
 def test_tflite_model():
     """Test the TFLite model with dummy data"""
     
-    # Load TFLite model
+    # Load TFLite model with all cores and, where available, the XNNPACK
+    # delegate - same best-effort setup as the serving path in main.py
     model_path = "modic_model.tflite"
-    interpreter = tf.lite.Interpreter(model_path=model_path)
+    num_threads = os.cpu_count()
+    try:
+        xnnpack_delegate = load_delegate('libtensorflowlite_xnnpack_delegate.so')
+        interpreter = Interpreter(
+            model_path=model_path,
+            num_threads=num_threads,
+            experimental_delegates=[xnnpack_delegate]
+        )
+    except Exception:
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
     interpreter.allocate_tensors()
     
     # Get input and output details
     input_details = interpreter.get_input_details()
     output_details = interpreter.get_output_details()
     
+    # Tensor indices cached once for the zero-copy handles below
+    in_idx = [d['index'] for d in input_details]
+    out_idx = [d['index'] for d in output_details]
+
+    # One joined string per details list means one print (and write syscall)
+    # per list instead of one per tensor
     print(f"🔍 Model Analysis:")
     print(f"   Input count: {len(input_details)}")
     print(f"   Output count: {len(output_details)}")
+    print('\n'.join(f"   Input {i}: {d['name']} - Shape: {d['shape']} - Type: {d['dtype']}"
+                    for i, d in enumerate(input_details)))
+    print('\n'.join(f"   Output {i}: {d['name']} - Shape: {d['shape']} - Type: {d['dtype']}"
+                    for i, d in enumerate(output_details)))
     
-    for i, detail in enumerate(input_details):
-        print(f"   Input {i}: {detail['name']} - Shape: {detail['shape']} - Type: {detail['dtype']}")
-    
-    for i, detail in enumerate(output_details):
-        print(f"   Output {i}: {detail['name']} - Shape: {detail['shape']} - Type: {detail['dtype']}")
-    
-    # Create dummy test images (224x224x3)
-    dummy_t1 = np.random.rand(1, 224, 224, 3).astype(np.float32)
-    dummy_t2 = np.random.rand(1, 224, 224, 3).astype(np.float32)
+    # Create dummy test images (224x224x3), drawn directly in float32 so no
+    # float64 intermediate is allocated and cast; seeded for reproducible runs
+    rng = np.random.default_rng(0)
+    dummy_t1 = rng.random((1, 224, 224, 3), dtype=np.float32)
+    dummy_t2 = rng.random((1, 224, 224, 3), dtype=np.float32)
     
     print(f"\n🧪 Testing with dummy data:")
     print(f"   T1 shape: {dummy_t1.shape}")
     print(f"   T2 shape: {dummy_t2.shape}")
     
-    # Set input tensors
-    interpreter.set_tensor(input_details[0]['index'], dummy_t1)
-    interpreter.set_tensor(input_details[1]['index'], dummy_t2)
-    
+    # Zero-copy handles into the interpreter's arena: writing through
+    # tensor()() skips the 600 KB memcpy set_tensor does per input, and the
+    # output is read in place instead of copied out by get_tensor
+    in0 = interpreter.tensor(in_idx[0])
+    in1 = interpreter.tensor(in_idx[1])
+    out0 = interpreter.tensor(out_idx[0])
+
+    in0()[:] = _quantize_input(dummy_t1, input_details[0])
+    in1()[:] = _quantize_input(dummy_t2, input_details[1])
+
     # Run inference
     interpreter.invoke()
-    
-    # Get output
-    output = interpreter.get_tensor(output_details[0]['index'])
+
+    # Get output, dequantized back to float32 scores if needed
+    output = _dequantize_output(out0(), output_details[0])
     
     print(f"\n🔮 Prediction Results:")
     print(f"   Raw output: {output}")
     print(f"   Output shape: {output.shape}")
     
     # Extract results
-    no_modic_score = float(output[0][0])
-    modic_score = float(output[0][1])
-    
-    print(f"   No Modic score: {no_modic_score:.4f}")
-    print(f"   Modic score: {modic_score:.4f}")
-    
-    # Determine prediction
-    if modic_score > no_modic_score:
-        label = "Modic"
-        confidence = modic_score
-    else:
-        label = "No Modic"
-        confidence = no_modic_score
+    print(f"   No Modic score: {output[0, 0]:.4f}")
+    print(f"   Modic score: {output[0, 1]:.4f}")
+
+    # Determine prediction: argmax + tuple indexing instead of manual
+    # branching, which stays vectorized if the output ever grows a batch dim
+    idx = int(np.argmax(output[0]))
+    confidence = float(output[0, idx])
+    label = ("No Modic", "Modic")[idx]
     
     print(f"\n✅ Final Prediction: {label} (confidence: {confidence:.4f})")
     return True